@@ -2,20 +2,26 @@
 
 import argparse
 import random
+import secrets
 import string
 
-def generate_random_string(length=8):
+# Letters and numbers used for the random string, built once at import
+_ALPHABET = string.ascii_letters + string.digits
+
+def generate_random_string(length=8, secure=False):
     """Generate a random string of specified length using letters and numbers.
     
     Args:
         length (int): Length of the random string to generate (default: 8)
+        secure (bool): Use the cryptographically secure ``secrets`` generator
+            instead of ``random`` (default: False)
         
     Returns:
         str: Random string of specified length
     """
-    # Use both letters and numbers for the random string
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choices(characters, k=length))
+    if secure:
+        return ''.join(secrets.choice(_ALPHABET) for _ in range(length))
+    return ''.join(random.choices(_ALPHABET, k=length))
 
 def main():
     parser = argparse.ArgumentParser(description='Generate a random string of specified length')
@@ -25,6 +31,11 @@ def main():
         default=8,
         help='Length of the random string (default: 8)'
     )
+    parser.add_argument(
+        '-s', '--secure',
+        action='store_true',
+        help='Use a cryptographically secure random generator'
+    )
     args = parser.parse_args()
     
     if args.length < 1:
@@ -32,7 +43,7 @@ def main():
         return 1
     
     # Generate and print the random string
-    random_string = generate_random_string(args.length)
+    random_string = generate_random_string(args.length, secure=args.secure)
     print(random_string)
     return 0
 
@@ -1,15 +1,343 @@
+import contextlib
+import hashlib
+import io
+import mmap
 import os
-import boto3
+import posixpath
+import queue
+import random
+import shutil
+import sys
 import zipfile
-import tempfile
 import logging
 import yaml
 import argparse
 import time
-from datetime import datetime
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from dotenv import load_dotenv
-from botocore.exceptions import ClientError
+
+def _load_zlib_backend(name):
+    """
+    Import the zlib-compatible module for a backend name
+    
+    :param name: 'zlib' (stdlib), 'zlib-ng' (zlib-ng package) or 'isal' (Intel ISA-L)
+    """
+    if name == 'zlib-ng':
+        from zlib_ng import zlib_ng as backend
+    elif name == 'isal':
+        from isal import isal_zlib as backend
+    elif name == 'zlib':
+        import zlib as backend
+    else:
+        raise ValueError(f"Invalid zlib backend: {name}")
+    return backend
+
+def _use_zlib_backend(backend):
+    """Route this module's and zipfile's compression and CRC32 through backend"""
+    global zlib
+    zlib = backend
+    zipfile.zlib = backend
+    zipfile.crc32 = backend.crc32
+
+try:
+    # zlib-ng is an API-compatible zlib with SIMD DEFLATE and CRC32; use it when installed
+    _use_zlib_backend(_load_zlib_backend('zlib-ng'))
+    DEFAULT_ZLIB_BACKEND = 'zlib-ng'
+except ImportError:
+    import zlib
+    DEFAULT_ZLIB_BACKEND = 'zlib'
+
+# An object listed from the source bucket; rel_path is its path inside the zip
+S3Object = namedtuple('S3Object', ['key', 'size', 'etag', 'last_modified', 'rel_path'])
+
+# Buffer size for zip output; coalesces zlib's small output blocks into large writes
+ZIP_WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Files at least this large are read through mmap instead of read() calls
+MMAP_MIN_SIZE = 4 * 1024 * 1024
+
+# Linux can sendfile between regular files; elsewhere the output must be a socket
+SENDFILE_TO_FILE = hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+
+# Already-compressed formats that DEFLATE cannot shrink; stored as-is
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.mp3', '.mp4', '.mov', '.webm',
+    '.zip', '.gz', '.bz2', '.xz', '.zst', '.br', '.7z', '.rar', '.parquet',
+}
+
+# Leading bytes of already-compressed formats, for files whose extension does not give them away
+STORED_SIGNATURES = (
+    b'\xff\xd8\xff',              # JPEG
+    b'\x89PNG\r\n\x1a\n',          # PNG
+    b'GIF87a', b'GIF89a',          # GIF
+    b'PK\x03\x04',                 # ZIP (also docx/xlsx/jar)
+    b'\x1f\x8b',                   # gzip
+    b'BZh',                        # bzip2
+    b'\xfd7zXZ\x00',               # xz
+    b'\x28\xb5\x2f\xfd',           # zstd
+    b"7z\xbc\xaf'\x1c",            # 7z
+    b'Rar!\x1a\x07',               # RAR
+    b'PAR1',                       # Parquet
+)
+
+def _has_stored_signature(file_path):
+    """Check whether a file starts with the signature of an already-compressed format"""
+    with open(file_path, 'rb') as f:
+        header = f.read(12)
+    # ISO media (mp4/mov/heic/avif) has the 'ftyp' box at offset 4; WebP is a RIFF container
+    if header[4:8] == b'ftyp' or (header[:4] == b'RIFF' and header[8:12] == b'WEBP'):
+        return True
+    return header.startswith(STORED_SIGNATURES)
+
+def _relative_key_path(key, prefix):
+    """
+    Get the path of key relative to the parent of the source prefix it was listed under
+    
+    e.g. prefix 'data/folder1/' maps 'data/folder1/a/b.txt' to 'folder1/a/b.txt',
+    and the single-object prefix 'data/one.txt' maps to 'one.txt'. Empty, '.'
+    and '..' components are dropped so a key can never escape the staging
+    directory.
+    """
+    parent = prefix.rstrip('/').rpartition('/')[0]
+    rel_path = key[len(parent) + 1:] if parent else key
+    return '/'.join(part for part in rel_path.split('/') if part not in ('', '.', '..'))
+
+def _mark_downloaded(local_file_path, obj):
+    """Set a downloaded file's mtime to the object's LastModified, marking the local copy as current"""
+    os.utime(local_file_path, (time.time(), obj.last_modified))
+
+def _unique_arcname(arcname, used):
+    """Return arcname, renamed to 'name (n).ext' if it is already in used, and record it"""
+    if arcname in used:
+        root, ext = posixpath.splitext(arcname)
+        n = 1
+        while f"{root} ({n}){ext}" in used:
+            n += 1
+        arcname = f"{root} ({n}){ext}"
+    used.add(arcname)
+    return arcname
+
+def _parent_directories(paths):
+    """Get every parent directory of '/'-separated paths, e.g. 'a/b/c.txt' gives 'a' and 'a/b'"""
+    dirs = set()
+    for path in paths:
+        parent = posixpath.dirname(path)
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = posixpath.dirname(parent)
+    return dirs
+
+def _deflate_file(file_path, compression_level, zlib_backend, detect_compressed=False):
+    """
+    Compress a file into a raw DEFLATE stream
+    
+    Runs in a worker thread (zlib releases the GIL while compressing) or a
+    worker process; the backend is passed by name so spawned processes use
+    the same one as the parent.
+    
+    :param detect_compressed: Check the file's leading bytes for an already-compressed format first
+    :return: Tuple of (crc32, uncompressed size, compressed bytes), or None if
+        the file is already compressed and should be stored
+    """
+    if detect_compressed and _has_stored_signature(file_path):
+        return None
+    zlib = _load_zlib_backend(zlib_backend)
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+    crc = 0
+    file_size = 0
+    chunks = []
+    with open(file_path, 'rb') as f:
+        for chunk in _file_chunks(f, os.fstat(f.fileno()).st_size):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    return crc, file_size, b''.join(chunks)
+
+def _file_chunks(f, size, chunk_size=1024 * 1024):
+    """
+    Yield successive chunks of an open file of the given size
+    
+    Files of at least MMAP_MIN_SIZE are mapped and yielded as memoryview
+    slices, with a sequential-access hint so the kernel reads ahead and
+    drops pages behind; this saves a read() call and a copy per chunk.
+    Callers must not keep a chunk past the next iteration.
+    """
+    if size < MMAP_MIN_SIZE:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(0, len(mapped), chunk_size):
+            with memoryview(mapped)[offset:offset + chunk_size] as chunk:
+                yield chunk
+
+def _file_crc32(src, size):
+    """CRC32 of an open file; large files are mapped so the data is never copied into Python"""
+    crc = 0
+    for chunk in _file_chunks(src, size, 64 * 1024 * 1024):
+        crc = zlib.crc32(chunk, crc)
+    return crc
+
+def _sendfile(dest, src, count):
+    """Copy count bytes from the start of src to the buffered file dest inside the kernel"""
+    # sendfile writes at the descriptor's offset, behind the buffered writer's back
+    dest.flush()
+    out_fd = dest.fileno()
+    offset = 0
+    while offset < count:
+        sent = os.sendfile(out_fd, src.fileno(), offset, count - offset)
+        if not sent:
+            raise OSError(f"File shrank while being added to the zip: {src.name}")
+        offset += sent
+    dest.seek(os.lseek(out_fd, 0, os.SEEK_CUR))
+
+def _write_raw_member(zipf, zinfo, data):
+    """
+    Append a member whose CRC, sizes and payload were computed outside of zipf
+    
+    Mirrors what ZipFile.mkdir/writestr do internally for the local header and
+    central directory bookkeeping.
+    
+    :param data: The payload, or an open file whose first compress_size bytes are sent with sendfile
+    """
+    with zipf._lock:
+        if zipf._seekable:
+            zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader())
+        if isinstance(data, bytes):
+            zipf.fp.write(data)
+        else:
+            _sendfile(zipf.fp, data, zinfo.compress_size)
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+        zipf.start_dir = zipf.fp.tell()
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Write-only file object that uploads everything written to it to S3
+    
+    Writes are buffered into parts of part_size bytes and each full part is
+    handed to a background upload_part as soon as it is available, so the
+    complete object is never held on disk or in memory and the writer keeps
+    going while parts are in flight. close() uploads the final part and
+    completes the multipart upload; abort() discards it instead.
+    """
+    
+    def __init__(self, s3_client, bucket, key, part_size=8 * 1024 * 1024, max_concurrency=4, metadata=None):
+        """
+        :param s3_client: boto3 S3 client
+        :param bucket: Destination bucket
+        :param key: Destination key
+        :param part_size: Size of each uploaded part (S3 requires at least 5 MiB)
+        :param max_concurrency: Number of parts uploaded at once; write() blocks beyond that
+        :param metadata: User metadata to store on the uploaded object
+        """
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self._buffer = bytearray()
+        self._parts = []
+        self._part_count = 0
+        self._position = 0
+        self._in_flight = deque()
+        self._max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            Metadata=metadata or {}
+        )['UploadId']
+    
+    def writable(self):
+        return True
+    
+    def tell(self):
+        return self._position
+    
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+    
+    def _upload_part(self, body):
+        self._part_count += 1
+        # The workers get no reference to the writer, so it can be finalized as soon as it's dropped
+        self._in_flight.append(self._executor.submit(
+            self._send_part, self.s3_client, self.bucket, self.key, self._upload_id, self._part_count, body
+        ))
+        # Bound the parts held in memory; this also surfaces upload errors promptly
+        while len(self._in_flight) > self._max_concurrency:
+            self._parts.append(self._in_flight.popleft().result())
+    
+    @staticmethod
+    def _send_part(s3_client, bucket, key, upload_id, part_number, body):
+        response = s3_client.upload_part(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+    
+    def close(self):
+        """Upload any remaining data and complete the multipart upload"""
+        if self.closed:
+            return
+        # The last part may be smaller than part_size; S3 needs at least one part
+        if self._buffer or not self._part_count:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        while self._in_flight:
+            self._parts.append(self._in_flight.popleft().result())
+        self._executor.shutdown()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts}
+        )
+        super().close()
+    
+    def abort(self):
+        """Abort the multipart upload, discarding any uploaded parts"""
+        if self.closed:
+            return
+        # Let running part uploads finish so none land after the abort
+        for future in self._in_flight:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self.s3_client.abort_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id
+        )
+        super().close()
+    
+    def __del__(self):
+        # IOBase.__del__ would call close() and complete a possibly truncated zip;
+        # an upload that was never closed explicitly is abandoned instead
+        if not self.closed:
+            try:
+                self.abort()
+            except Exception:
+                pass
 
 class S3FolderZipper:
     def __init__(self, config_path, dry_run=False):
@@ -24,6 +352,10 @@ class S3FolderZipper:
         
         self.config = self._load_config(config_path)
         self.s3_client = self._initialize_s3_client()
+        self.transfer_config = self._initialize_transfer_config()
+        self.stored_extensions = self._load_stored_extensions()
+        self.zlib_backend = self._initialize_zlib_backend()
+        self.compression = self._compression_settings()
         self.dry_run = dry_run
         
         # Set up logging
@@ -31,6 +363,8 @@ class S3FolderZipper:
     
     def _load_environment(self):
         """Load environment variables from .env file"""
+        from dotenv import load_dotenv
+        
         env_path = Path('.env')
         if not env_path.exists():
             raise ValueError(
@@ -48,8 +382,10 @@ class S3FolderZipper:
                 f"Missing required AWS credentials in .env file: {', '.join(missing_vars)}"
             )
     
-    def _initialize_s3_client(self):
-        """Initialize S3 client with credentials from environment"""
+    def _client_kwargs(self):
+        """Build the keyword arguments used to create S3 clients"""
+        from botocore.config import Config
+        
         # Get credentials from environment variables
         credentials = {
             'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID'),
@@ -64,7 +400,74 @@ class S3FolderZipper:
         if region:
             credentials['region_name'] = region
         
-        return boto3.client('s3', **credentials)
+        # Threaded downloads keep up to _download_concurrency() GETs in flight, and the
+        # async downloader up to download_concurrency; size the pool for the peak so
+        # requests never queue for a connection
+        options = self.config.get('options', {})
+        max_pool_connections = max(
+            64,
+            self._download_concurrency(),
+            options.get('download_concurrency', 256) if options.get('async_downloads') else 0
+        )
+        
+        # Let adaptive retries throttle on SlowDown, and keep idle connections alive;
+        # Transfer Acceleration routes cross-region traffic through the nearest edge location
+        client_config = Config(
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': options.get('max_attempts', 10), 'mode': 'adaptive'},
+            tcp_keepalive=True,
+            s3={
+                'addressing_style': 'virtual',
+                'use_accelerate_endpoint': self.config['aws'].get('accelerate', False)
+            }
+        )
+        
+        return {'config': client_config, **credentials}
+    
+    def _initialize_s3_client(self):
+        """Initialize S3 client with credentials from environment"""
+        # Imported here so --help and config errors don't pay boto3's import time
+        import boto3
+        
+        # Use a session of our own rather than boto3's module-wide default one; its single
+        # thread-safe client is shared by listing, HEADs, downloads and uploads
+        self._session = boto3.session.Session()
+        return self._session.client('s3', **self._client_kwargs())
+    
+    def _initialize_transfer_config(self, max_concurrency=None):
+        """
+        Build the transfer config used to split large objects into ranged GETs
+        
+        :param max_concurrency: Requests in flight at once (default: options.multipart_concurrency)
+        """
+        from boto3.s3.transfer import TransferConfig
+        
+        options = self.config.get('options', {})
+        mb = 1024 * 1024
+        
+        return TransferConfig(
+            multipart_threshold=options.get('multipart_threshold_mb', 8) * mb,
+            multipart_chunksize=options.get('multipart_chunksize_mb', 64) * mb,
+            max_concurrency=max_concurrency or options.get('multipart_concurrency', 16),
+            use_threads=True
+        )
+    
+    def _download_concurrency(self):
+        """Get the number of GETs the threaded downloader keeps in flight"""
+        options = self.config.get('options', {})
+        return max(options.get('download_threads', 16), options.get('multipart_concurrency', 16))
+        
+    def _initialize_zlib_backend(self):
+        """Switch to the zlib backend selected by options.zlib_backend"""
+        name = self.config.get('options', {}).get('zlib_backend', 'auto')
+        if name == 'auto':
+            return DEFAULT_ZLIB_BACKEND
+        
+        try:
+            _use_zlib_backend(_load_zlib_backend(name))
+        except ImportError:
+            raise ValueError(f"zlib backend '{name}' is not installed")
+        return name
         
     def _load_config(self, config_path):
         """Load and validate YAML configuration"""
@@ -109,18 +512,26 @@ class S3FolderZipper:
         self.logger = logging.getLogger(__name__)
 
     def _list_s3_files(self, prefix):
-        """List files in an S3 prefix"""
+        """List files in an S3 prefix as S3Object tuples"""
+        from botocore.exceptions import ClientError
+        
         files = []
         
         # If prefix doesn't end with '/', treat it as an individual object
         if not prefix.endswith('/'):
             try:
                 # Check if the object exists
-                self.s3_client.head_object(
+                response = self.s3_client.head_object(
                     Bucket=self.config['aws']['source_bucket'],
                     Key=prefix
                 )
-                files.append(prefix)
+                files.append(S3Object(
+                    prefix,
+                    response['ContentLength'],
+                    response['ETag'],
+                    response['LastModified'].timestamp(),
+                    _relative_key_path(prefix, prefix)
+                ))
                 return files
             except ClientError as e:
                 if e.response['Error']['Code'] == '404':
@@ -130,72 +541,408 @@ class S3FolderZipper:
                 return files
 
         # If prefix ends with '/', treat it as a folder
+        files = self._list_folder(prefix)
+        if not files:
+            self.logger.warning(f"No contents found for prefix: {prefix}")
+        
+        return files
+
+    def _list_folder(self, prefix, recursive=True, start_after=None, until=None):
+        """
+        List the objects under a folder prefix as S3Object tuples
+        
+        :param recursive: If False, only list objects directly in the folder, not in subfolders
+        :param start_after: Only list keys that sort after this one
+        :param until: Stop listing once keys sort after this one
+        """
         paginator = self.s3_client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(Bucket=self.config['aws']['source_bucket'], Prefix=prefix)
+        pages = paginator.paginate(
+            Bucket=self.config['aws']['source_bucket'],
+            Prefix=prefix,
+            PaginationConfig={'PageSize': 1000},
+            **({} if recursive else {'Delimiter': '/'}),
+            **({'StartAfter': start_after} if start_after else {})
+        )
         
-        for page in pages:
-            if 'Contents' not in page:
-                self.logger.warning(f"No contents found for prefix: {prefix}")
+        # Project each page down to the fields we use; pages without Contents yield None
+        files = []
+        for entry in pages.search('Contents[].[Key, Size, ETag, LastModified]'):
+            # Skip empty pages and folder placeholder objects, including the folder itself
+            if entry is None or entry[0].endswith('/'):
                 continue
             
-            for obj in page['Contents']:
-                # Skip if the object is the folder itself
-                if obj['Key'] == prefix:
-                    continue
-                    
-                files.append(obj['Key'])
-        
+            key, size, etag, last_modified = entry
+            # Keys are listed in order, so no later page can hold a wanted key
+            if until is not None and key > until:
+                break
+            files.append(S3Object(key, size, etag, last_modified.timestamp(), _relative_key_path(key, prefix)))
         return files
 
-    def _download_files(self, files, local_dir):
-        """Download files from S3"""
-        downloaded_files = []
-        skipped_files = []
-        
-        for file in files:
-            # For individual objects (not in folders), use just the filename
-            if '/' not in file or file.count('/') == 1 and file.endswith('/'):
-                local_path = os.path.basename(file)
+    def _list_sources(self, prefixes):
+        """
+        List every source prefix, returning {prefix: [S3Object, ...]} in config order
+        
+        Folder prefixes are listed first so single-object prefixes inside them
+        are answered from those listings. The remaining single objects that
+        share a parent folder and a longer common key prefix (e.g. part-0001.csv,
+        part-0002.csv) are found with one LIST bounded to that prefix and their
+        key range instead of a HEAD each; any others are HEADed, as are all of
+        them when the credentials lack s3:ListBucket.
+        """
+        from botocore.exceptions import ClientError
+        
+        listings = {prefix: self._list_s3_files(prefix) for prefix in prefixes if prefix.endswith('/')}
+        listed = {obj.key: obj for files in listings.values() for obj in files}
+        
+        by_parent = defaultdict(list)
+        for prefix in prefixes:
+            if not prefix.endswith('/') and prefix not in listed:
+                by_parent[posixpath.dirname(prefix)].append(prefix)
+        
+        # Single-object prefixes that were looked up in a listing, found or not
+        looked_up = set()
+        for parent, keys in by_parent.items():
+            common = os.path.commonprefix(keys)
+            # A prefix no narrower than the folder would page through all of it
+            if len(keys) < 2 or len(common) <= len(parent) + bool(parent):
+                continue
+            first, last = min(keys), max(keys)
+            try:
+                batch = self._list_folder(common, recursive=False, start_after=first[:-1], until=last)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'AccessDenied':
+                    raise
+                # A key-scoped policy may grant GetObject without ListBucket
+                self.logger.info("Listing source objects is not permitted, looking them up one by one")
+                break
+            listed.update((obj.key, obj) for obj in batch)
+            looked_up.update(keys)
+        
+        sources = {}
+        for prefix in prefixes:
+            if prefix.endswith('/'):
+                sources[prefix] = listings[prefix]
+            elif prefix in listed:
+                sources[prefix] = [listed[prefix]._replace(rel_path=_relative_key_path(prefix, prefix))]
+            elif prefix in looked_up:
+                self.logger.warning(f"Object not found: {prefix}")
+                sources[prefix] = []
             else:
-                # Extract the lowest level folder name and file name
-                path_parts = Path(file).parts
-                if len(path_parts) > 1:
-                    # Use only the last folder name and file name for the local path
-                    local_path = os.path.join(path_parts[-2], path_parts[-1])
-                else:
-                    local_path = path_parts[-1]
+                sources[prefix] = self._list_s3_files(prefix)
+        return sources
+
+    def _staging_directory(self):
+        """
+        Get a context manager yielding the local directory to stage files in
+        
+        zip_config.staging selects 'directory' (local_directory, the default),
+        'memory' (a temporary directory on /dev/shm) or 'temp' (a temporary
+        directory under $TMPDIR, e.g. instance NVMe). Temporary directories
+        are removed when the context exits.
+        """
+        import tempfile
+        
+        staging = self.config['zip_config'].get('staging', 'directory')
+        if staging == 'memory':
+            if not os.path.isdir('/dev/shm'):
+                raise ValueError("zip_config.staging 'memory' requires /dev/shm")
+            return tempfile.TemporaryDirectory(dir='/dev/shm')
+        if staging == 'temp':
+            return tempfile.TemporaryDirectory()
+        if staging != 'directory':
+            raise ValueError(f"Invalid zip_config.staging: {staging}")
+        
+        local_dir = self.config['zip_config'].get('local_directory', 'output')
+        local_dir = os.path.abspath(local_dir)
+        os.makedirs(local_dir, exist_ok=True)
+        return contextlib.nullcontext(local_dir)
+
+    def _local_file_path(self, obj, local_dir):
+        """
+        Get the local path for an S3Object and whether it still needs downloading
+        
+        :return: Tuple of (local file path, True if the file must be downloaded)
+        """
+        # Construct full local file path
+        local_file_path = os.path.join(local_dir, obj.rel_path.replace('/', os.sep))
+        
+        # A completed download has the object's size and its LastModified as mtime; anything
+        # else is a partial file or a stale copy of an object that has since been replaced
+        try:
+            stat = os.stat(local_file_path)
+        except FileNotFoundError:
+            pass
+        else:
+            if stat.st_size == obj.size and int(stat.st_mtime) == int(obj.last_modified):
+                self.logger.info(f"File already exists locally, skipping download: {local_file_path}")
+                return local_file_path, False
+        
+        # Ensure local directory exists
+        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+        return local_file_path, True
+
+    def _wait_for_download(self, obj, local_file_path, future):
+        """Wait for a submitted download, marking the local copy as current or removing it on error"""
+        try:
+            future.result()
+            _mark_downloaded(local_file_path, obj)
+            self.logger.info(f"Downloaded: {obj.key} to {local_file_path}")
+        except Exception as e:
+            self.logger.error(f"Error downloading {obj.key}: {e}")
+            if os.path.exists(local_file_path):
+                os.remove(local_file_path)  # Remove partially downloaded file
+            raise
+
+    def _download_files(self, files, local_dir):
+        """
+        Download files from S3 in parallel
+        
+        :return: List of (S3Object, local file path) for every file, in no particular order
+        """
+        from boto3.s3.transfer import create_transfer_manager
+        from s3transfer.subscribers import BaseSubscriber
+        
+        # Listing order clusters keys by prefix; shuffle so concurrent GETs spread across
+        # S3's per-prefix partitions. _create_zip sorts the members, so order is free
+        files = random.sample(files, len(files))
+        
+        if self.config['options'].get('download_processes'):
+            return self._download_files_multiprocess(files, local_dir)
+        if self.config['options'].get('async_downloads'):
+            import asyncio
+            return asyncio.run(self._download_files_async(files, local_dir))
+        
+        class DownloadSubscriber(BaseSubscriber):
+            """Hand s3transfer the listed size and ETag, and report each download as it finishes"""
             
-            # Construct full local file path
-            local_file_path = os.path.join(local_dir, local_path)
+            def __init__(self, obj):
+                self.obj = obj
             
-            # Check if file already exists and has content
-            if os.path.exists(local_file_path) and os.path.getsize(local_file_path) > 0:
-                self.logger.info(f"File already exists locally, skipping download: {local_file_path}")
-                skipped_files.append(local_file_path)
-                continue
+            def on_queued(self, future, **kwargs):
+                # Without them every download would start with its own HEAD; older
+                # s3transfer releases only need the size
+                future.meta.provide_transfer_size(self.obj.size)
+                if hasattr(future.meta, 'provide_object_etag'):
+                    future.meta.provide_object_etag(self.obj.etag)
             
-            # Ensure local directory exists
-            os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+            def on_done(self, future, **kwargs):
+                done.put(future)
+        
+        bucket = self.config['aws']['source_bucket']
+        # The manager's request executor is the only limit on GETs in flight, shared by whole
+        # objects and the ranged parts of large ones, so size it for the whole batch
+        transfer_config = self._initialize_transfer_config(self._download_concurrency())
+        
+        # One transfer manager for the whole batch; download_file would build a new one per object
+        local_files = []
+        done = queue.Queue()
+        with create_transfer_manager(self.s3_client, transfer_config) as manager:
+            submitted = {}
+            for obj in files:
+                local_file_path, needs_download = self._local_file_path(obj, local_dir)
+                local_files.append((obj, local_file_path))
+                if needs_download:
+                    future = manager.download(
+                        bucket, obj.key, local_file_path, subscribers=[DownloadSubscriber(obj)]
+                    )
+                    submitted[future] = (obj, local_file_path)
             
-            # Download the file
+            # Handle downloads as they finish so a failure surfaces at once; on error,
+            # leaving the block cancels the downloads that haven't finished
+            for _ in range(len(submitted)):
+                future = done.get()
+                self._wait_for_download(*submitted[future], future)
+        
+        return local_files
+
+    async def _download_files_async(self, files, local_dir):
+        """
+        Download files from S3 with aioboto3 on a single event loop
+        
+        Used when options.async_downloads is set; hundreds of GETs can be in
+        flight without a thread per request.
+        """
+        import asyncio
+        try:
+            import aioboto3
+        except ImportError:
+            raise ValueError("async_downloads requires aioboto3 (pip install aioboto3)")
+        
+        bucket = self.config['aws']['source_bucket']
+        # Cap in-flight downloads so a large batch doesn't trigger SlowDown throttling
+        semaphore = asyncio.Semaphore(self.config['options'].get('download_concurrency', 256))
+        
+        async def download(s3, obj):
+            local_file_path, needs_download = self._local_file_path(obj, local_dir)
+            if not needs_download:
+                return obj, local_file_path
+            
+            # aioboto3 writes in place, so download beside the target and rename when complete
+            temp_file_path = local_file_path + '.download'
+            async with semaphore:
+                try:
+                    await s3.download_file(bucket, obj.key, temp_file_path, Config=self.transfer_config)
+                    os.replace(temp_file_path, local_file_path)
+                    _mark_downloaded(local_file_path, obj)
+                    self.logger.info(f"Downloaded: {obj.key} to {local_file_path}")
+                except Exception as e:
+                    self.logger.error(f"Error downloading {obj.key}: {e}")
+                    if os.path.exists(temp_file_path):
+                        os.remove(temp_file_path)  # Remove partially downloaded file
+                    raise
+            return obj, local_file_path
+        
+        async with aioboto3.Session().client('s3', **self._client_kwargs()) as s3:
+            tasks = [asyncio.create_task(download(s3, obj)) for obj in files]
             try:
-                self.s3_client.download_file(
-                    self.config['aws']['source_bucket'], 
-                    file, 
-                    local_file_path
-                )
-                downloaded_files.append(local_file_path)
-                self.logger.info(f"Downloaded: {file} to {local_file_path}")
-            except Exception as e:
-                self.logger.error(f"Error downloading {file}: {e}")
-                if os.path.exists(local_file_path):
-                    os.remove(local_file_path)  # Remove partially downloaded file
+                return await asyncio.gather(*tasks)
+            except Exception:
+                # Don't start any downloads still waiting behind the failure
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
                 raise
+
+    def _download_files_multiprocess(self, files, local_dir):
+        """
+        Download files from S3 with a pool of worker processes
+        
+        Used when options.download_processes is set, so that hashing, parsing
+        and writing are spread across cores instead of sharing one GIL.
+        """
+        from s3transfer.processpool import ProcessPoolDownloader, ProcessTransferConfig
+        
+        options = self.config['options']
+        bucket = self.config['aws']['source_bucket']
+        mb = 1024 * 1024
+        process_config = ProcessTransferConfig(
+            multipart_threshold=options.get('multipart_threshold_mb', 8) * mb,
+            multipart_chunksize=options.get('multipart_chunksize_mb', 64) * mb,
+            max_request_processes=options['download_processes']
+        )
+        
+        local_files = []
+        with ProcessPoolDownloader(
+            client_kwargs=self._client_kwargs(),
+            config=process_config
+        ) as downloader:
+            futures = []
+            for obj in files:
+                local_file_path, needs_download = self._local_file_path(obj, local_dir)
+                local_files.append((obj, local_file_path))
+                if needs_download and obj.size == 0:
+                    # The process pool can't write zero-length objects; there is nothing to fetch
+                    open(local_file_path, 'wb').close()
+                    _mark_downloaded(local_file_path, obj)
+                elif needs_download:
+                    # The listed size spares each download a HEAD in the worker
+                    future = downloader.download_file(bucket, obj.key, local_file_path, expected_size=obj.size)
+                    futures.append((obj, local_file_path, future))
+            
+            for obj, local_file_path, future in futures:
+                self._wait_for_download(obj, local_file_path, future)
+        
+        return local_files
+
+    def _compression_settings(self):
+        """Get the default zip compression method and level from config"""
+        options = self.config['options']
+        compression = options.get('compression', 'deflate')
+        if compression == 'none':
+            return zipfile.ZIP_STORED, None
+        if compression == 'zstd':
+            return self._zstd_settings()
+        if compression != 'deflate':
+            raise ValueError(f"Invalid compression: {compression}")
+        
+        compression_level = options.get('compression_level', 6)
+        if not isinstance(compression_level, int) or not 0 <= compression_level <= 9:
+            raise ValueError(f"Invalid compression_level: {compression_level} (expected 0-9)")
+        if self.zlib_backend == 'isal':
+            # ISA-L only has levels 0-3; map zlib's 1-9 onto them (1-3 -> 1, 4-6 -> 2, 7-9 -> 3)
+            compression_level = (compression_level + 2) // 3
+        return zipfile.ZIP_DEFLATED, compression_level
+
+    def _zstd_settings(self):
+        """Get the Zstandard (zip method 93) compression method and level from config"""
+        if not hasattr(zipfile, 'ZIP_ZSTANDARD'):
+            # Python < 3.14 has no native support; zipfile-zstd patches it into zipfile
+            try:
+                import zipfile_zstd  # noqa: F401
+            except ImportError:
+                raise ValueError("compression 'zstd' requires Python 3.14+ or zipfile-zstd (pip install zipfile-zstd)")
+        
+        compression_level = self.config['options'].get('compression_level', 3)
+        if not isinstance(compression_level, int) or not 1 <= compression_level <= 22:
+            raise ValueError(f"Invalid compression_level for zstd: {compression_level} (expected 1-22)")
+        return zipfile.ZIP_ZSTANDARD, compression_level
+
+    def _load_stored_extensions(self):
+        """Get the file extensions that are stored without compression"""
+        extensions = self.config.get('options', {}).get('stored_extensions')
+        if extensions is None:
+            return STORED_EXTENSIONS
+        # Normalize to lowercase with a leading dot, as os.path.splitext returns
+        return {
+            ext.lower() if ext.startswith('.') else f".{ext.lower()}"
+            for ext in extensions
+        }
+
+    def _member_compression(self, name, compression, file_path=None):
+        """
+        Get the compression method for a single zip member
         
-        return downloaded_files + skipped_files
+        :param file_path: Local copy of the member; when given, its leading bytes are checked too
+        """
+        if compression == zipfile.ZIP_STORED:
+            return compression
+        if os.path.splitext(name)[1].lower() in self.stored_extensions:
+            return zipfile.ZIP_STORED
+        if (file_path is not None and self.config['options'].get('detect_compressed', True)
+                and _has_stored_signature(file_path)):
+            return zipfile.ZIP_STORED
+        return compression
+
+    def _is_valid_zip(self, zip_path):
+        """
+        Check that an existing zip file is intact
+        
+        By default only the structure is checked: the central directory must
+        parse and every member's data must fit inside the file. Set
+        options.deep_verify to also decompress every member and check its CRC.
+        """
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zipf:
+                members = zipf.infolist()
+                if self.config['options'].get('deep_verify', False):
+                    return zipf.testzip() is None
+        except (zipfile.BadZipFile, zlib.error):
+            return False
+        
+        # Rule out truncation: the last member's local header and data must fit in the file
+        if members:
+            last = max(members, key=lambda zinfo: zinfo.header_offset)
+            member_end = last.header_offset + 30 + len(last.filename.encode()) + last.compress_size
+            if os.path.getsize(zip_path) < member_end:
+                return False
+        return True
+
+    def _zip_manifest(self, zip_path):
+        """Get the manifest recorded in a zip's comment by _create_zip"""
+        with zipfile.ZipFile(zip_path, 'r') as zipf:
+            return zipf.comment.decode('ascii', errors='replace')
 
-    def _create_zip(self, files_dir):
-        """Create a zip file from downloaded files"""
+    def _create_zip(self, files, files_dir, manifest):
+        """
+        Create a zip file from downloaded files
+        
+        :param files: List of (S3Object, local file path) from _download_files; only these
+            are zipped, whatever else is in files_dir
+        :param files_dir: Staging directory the zip is written to
+        :param manifest: Manifest of the source files, stored as the zip comment so a
+            leftover zip is only reused if it was built from the same sources
+        :return: Tuple of (zip file path, zip size in bytes)
+        """
         # Get the output directory (same as files_dir in this case)
         output_dir = files_dir
         
@@ -203,80 +950,284 @@ class S3FolderZipper:
         zip_name = self.config['zip_config']['output_zip_name']
         zip_path = os.path.join(output_dir, zip_name)
         
-        # Check if zip file already exists and is valid
+        # Check if zip file already exists, is valid and matches the current sources
         if os.path.exists(zip_path):
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zipf:
-                    # Test the zip file integrity
-                    if zipf.testzip() is None:
-                        self.logger.info(f"Valid zip file already exists: {zip_path}")
-                        return zip_path
-            except zipfile.BadZipFile:
+            if not self._is_valid_zip(zip_path):
                 self.logger.warning(f"Existing zip file is corrupt, recreating: {zip_path}")
-                os.remove(zip_path)
+            elif self._zip_manifest(zip_path) != manifest:
+                self.logger.info(f"Existing zip file was built from different source files, recreating: {zip_path}")
+            else:
+                self.logger.info(f"Valid zip file already exists: {zip_path}")
+                return zip_path, os.path.getsize(zip_path)
+            os.remove(zip_path)
         
-        compression = zipfile.ZIP_DEFLATED
-        compression_level = self.config['options'].get('compression_level', 9)
+        compression, compression_level = self.compression
+        compress_processes = self.config['options'].get('compress_processes')
+        if compress_processes:
+            # Processes sidestep the GIL for the CRC and buffer handling around zlib
+            compress_threads = compress_processes
+            executor = ProcessPoolExecutor(max_workers=compress_processes)
+        else:
+            compress_threads = self.config['options'].get('compress_threads', os.cpu_count() or 1)
+            executor = ThreadPoolExecutor(max_workers=compress_threads)
+        parallel_max_size = self.config['options'].get('parallel_compress_max_mb', 64) * 1024 * 1024
+        buffer_max_size = self.config['options'].get('compress_buffer_mb', 512) * 1024 * 1024
+        detect_compressed = self.config['options'].get('detect_compressed', True)
         
         self.logger.info(f"Creating zip file: {zip_path}")
-        with zipfile.ZipFile(
-            zip_path, 'w',
-            compression=compression,
-            compresslevel=compression_level
-        ) as zipf:
-            for root, _, files in os.walk(files_dir):
-                for file in files:
-                    # Skip if this is the zip file itself
-                    if file == zip_name:
-                        continue
-                        
-                    file_path = os.path.join(root, file)
-                    
-                    # Get the relative path from the files directory
-                    rel_path = os.path.relpath(file_path, files_dir)
+        with open(zip_path, 'wb', buffering=ZIP_WRITE_BUFFER_SIZE) as zip_file:
+            with zipfile.ZipFile(
+                zip_file, 'w',
+                compression=compression,
+                compresslevel=compression_level
+            ) as zipf, executor:
+                zipf.comment = manifest.encode()
+                
+                # Members being compressed by the pool, written in submission order, and
+                # their total size; compressed results are rarely larger than their input
+                pending = deque()
+                pending_bytes = 0
+                
+                def write_oldest():
+                    nonlocal pending_bytes
+                    file_path, arcname, future, size = pending.popleft()
+                    pending_bytes -= size
+                    self._write_compressed(zipf, file_path, arcname, future)
+                
+                for obj, file_path in sorted(files, key=lambda item: item[0].rel_path):
+                    arcname = obj.rel_path
+                    member_compression = self._member_compression(arcname, compression)
                     
-                    # Extract the lowest level folder name from the path
-                    path_parts = Path(rel_path).parts
-                    if len(path_parts) > 1:
-                        # Use only the last folder name and the file name
-                        arcname = os.path.join(path_parts[-2], path_parts[-1])
-                    else:
-                        # If there's no folder, just use the file name
-                        arcname = path_parts[-1]
+                    # Compress files that fit comfortably in memory on the pool; downloads
+                    # are checked against the listed size, so it is the local size too
+                    if (member_compression == zipfile.ZIP_DEFLATED and compress_threads > 1
+                            and obj.size <= parallel_max_size):
+                        # The worker also sniffs the file's header, keeping that read off this thread
+                        future = executor.submit(
+                            _deflate_file, file_path, compression_level, self.zlib_backend, detect_compressed
+                        )
+                        pending.append((file_path, arcname, future, obj.size))
+                        pending_bytes += obj.size
+                        # Bound the compressed members held in memory, by count and by bytes
+                        while len(pending) > compress_threads * 2 or pending_bytes > buffer_max_size:
+                            write_oldest()
+                        continue
                     
-                    zipf.write(file_path, arcname=arcname)
+                    # Member order doesn't matter, so keep the pool busy while this one is
+                    # written; only results that are already done are written out first
+                    while pending and pending[0][2].done():
+                        write_oldest()
+                    # This thread reads the whole file anyway, so the header check costs nothing extra
+                    member_compression = self._member_compression(arcname, member_compression, file_path)
+                    self._write_file(zipf, file_path, arcname, member_compression, compression_level)
                     self.logger.debug(f"Added to zip: {arcname}")
+                
+                while pending:
+                    write_oldest()
+            
+            # The offset after the central directory is the zip size, without a stat of the result
+            zip_size = zip_file.tell()
         
         self.logger.info(f"Created zip file: {zip_path}")
-        return zip_path
+        return zip_path, zip_size
 
-    def _upload_zip(self, zip_path):
-        """Upload zip file to S3"""
+    def _write_file(self, zipf, file_path, arcname, compress_type, compression_level):
+        """
+        Add a file to the zip from the main thread
+        
+        On Linux, stored members of at least MMAP_MIN_SIZE get their CRC from an
+        mmap of the file and their bytes are copied into the zip with sendfile,
+        so the data never passes through Python; smaller ones stay in the
+        buffered writer, as a flush and seek per member would cost more than
+        the copy. All other members are fed to ZipFile.open from _file_chunks
+        (1 MiB reads, or mmap slices for large files) instead of ZipFile.write's
+        8 KiB reads.
+        """
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = compress_type
+        # Python 3.13 renamed ZipInfo._compresslevel to compress_level
+        if hasattr(zinfo, 'compress_level'):
+            zinfo.compress_level = compression_level
+        else:
+            zinfo._compresslevel = compression_level
+        
+        with open(file_path, 'rb') as src:
+            if compress_type == zipfile.ZIP_STORED and SENDFILE_TO_FILE and zinfo.file_size >= MMAP_MIN_SIZE:
+                zinfo.file_size = zinfo.compress_size = os.fstat(src.fileno()).st_size
+                zinfo.CRC = _file_crc32(src, zinfo.file_size)
+                _write_raw_member(zipf, zinfo, src)
+                return
+            with zipf.open(zinfo, 'w') as dest:
+                for chunk in _file_chunks(src, zinfo.file_size):
+                    dest.write(chunk)
+
+    def _write_compressed(self, zipf, file_path, arcname, future):
+        """Write a member compressed by the compressor pool into the zip"""
+        result = future.result()
+        if result is None:
+            # The worker found an already-compressed format; store it instead
+            self._write_file(zipf, file_path, arcname, zipfile.ZIP_STORED, None)
+            self.logger.debug(f"Added to zip: {arcname}")
+            return
+        crc, file_size, data = result
+        
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(data)
+        
+        _write_raw_member(zipf, zinfo, data)
+        self.logger.debug(f"Added to zip: {arcname}")
+
+    def _fetch_object(self, obj, buffer=True):
+        """
+        GET an S3Object from the source bucket
+        
+        :param buffer: Read the whole body into memory, as prefetch threads do
+            so the zip writer never waits on them; otherwise the open body is
+            returned for the caller to stream and close
+        :return: Tuple of (content length, readable body)
+        """
+        response = self.s3_client.get_object(Bucket=self.config['aws']['source_bucket'], Key=obj.key)
+        body = response['Body']
+        if buffer:
+            with contextlib.closing(body):
+                body = io.BytesIO(body.read())
+        return response['ContentLength'], body
+
+    def _write_streamed(self, zipf, obj, future, compression):
+        """
+        Copy an S3 object into the zip
+        
+        :param future: Prefetch of the buffered object, or None to GET it now and
+            stream it from the response
+        """
+        if future is None:
+            content_length, body = self._fetch_object(obj, buffer=False)
+        else:
+            content_length, body = future.result()
+        arcname = obj.rel_path
+        member = arcname
+        if self._member_compression(arcname, compression) != compression:
+            # Override the archive-wide method for already-compressed formats
+            member = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+            member.compress_type = zipfile.ZIP_STORED
+        
+        # Size is only known up front from the response, so flag large members for Zip64
+        force_zip64 = content_length * 1.05 > zipfile.ZIP64_LIMIT
+        # Closing the body releases its connection even if the copy fails part way
+        with contextlib.closing(body), zipf.open(member, 'w', force_zip64=force_zip64) as dest:
+            shutil.copyfileobj(body, dest, 1024 * 1024)
+        self.logger.debug(f"Streamed to zip: {obj.key} as {arcname}")
+
+    def _stream_zip(self, files, dest_bucket, dest_key, manifest):
+        """
+        Create a zip file by streaming S3 objects straight into a multipart upload
+        
+        Objects up to stream_buffer_max_mb among the next options.stream_prefetch
+        are fetched into memory in the background while the current one is
+        compressed, so the writer is never idle waiting on a request round-trip.
+        Larger objects are only requested when their turn comes, so no open
+        response sits stalled on a connection behind a long member.
+        
+        :return: Size of the uploaded zip file in bytes
+        """
+        compression, compression_level = self.compression
+        part_size = self.config['options'].get('upload_part_size_mb', 8) * 1024 * 1024
+        upload_concurrency = self.config['options'].get('upload_concurrency', 4)
+        prefetch = self.config['options'].get('stream_prefetch', 8)
+        buffer_max_size = self.config['options'].get('stream_buffer_max_mb', 8) * 1024 * 1024
+        
+        self.logger.info(f"Streaming S3 objects into zip file: s3://{dest_bucket}/{dest_key}")
+        writer = S3MultipartWriter(
+            self.s3_client, dest_bucket, dest_key, part_size, upload_concurrency,
+            metadata={'manifest': manifest}
+        )
+        try:
+            with zipfile.ZipFile(
+                writer, 'w',
+                compression=compression,
+                compresslevel=compression_level
+            ) as zipf, ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+                # Bounded window of upcoming objects, written in listing order; large
+                # ones have no prefetch and are fetched by _write_streamed
+                pending = deque()
+                try:
+                    for obj in files:
+                        future = executor.submit(self._fetch_object, obj) if obj.size <= buffer_max_size else None
+                        pending.append((obj, future))
+                        if len(pending) > prefetch:
+                            self._write_streamed(zipf, *pending.popleft(), compression)
+                    while pending:
+                        self._write_streamed(zipf, *pending.popleft(), compression)
+                except BaseException:
+                    for _, future in pending:
+                        if future is not None:
+                            future.cancel()
+                    raise
+            writer.close()
+        except BaseException as e:
+            # ZipFile.__exit__ has already written a central directory, even on
+            # KeyboardInterrupt; never let that truncated archive be completed
+            self.logger.error(f"Error streaming zip: {e!r}")
+            writer.abort()  # Discard the parts uploaded so far
+            raise
+        
+        self.logger.info(f"Successfully uploaded zip to: {dest_key}")
+        return writer.tell()
+
+    def _destination(self):
+        """Get the destination bucket and key for the zip file"""
         dest_prefix = self.config['zip_config'].get('destination_prefix', '')
         dest_bucket = self.config['aws']['destination_bucket']
-        dest_key = os.path.join(dest_prefix, os.path.basename(zip_path)).replace('\\', '/')
+        zip_name = os.path.basename(self.config['zip_config']['output_zip_name'])
+        # S3 keys always use '/', regardless of the local OS
+        dest_key = posixpath.join(dest_prefix, zip_name)
+        return dest_bucket, dest_key
+
+    def _destination_metadata(self, dest_bucket, dest_key):
+        """Get the user metadata of the existing destination zip, or None if it doesn't exist"""
+        from botocore.exceptions import ClientError
         
-        # Check if file already exists in S3
         try:
-            self.s3_client.head_object(
+            response = self.s3_client.head_object(
                 Bucket=dest_bucket,
                 Key=dest_key
             )
-            if not self.config['options'].get('overwrite_s3', False):
-                self.logger.info(f"File exists in S3 and overwrite_s3 is False, skipping upload: s3://{dest_bucket}/{dest_key}")
-                return
-            else:
-                self.logger.info(f"File exists in S3 and overwrite_s3 is True, uploading: s3://{dest_bucket}/{dest_key}")
         except ClientError:
             self.logger.info(f"File does not exist in S3, uploading: s3://{dest_bucket}/{dest_key}")
+            return None
+        return response.get('Metadata', {})
+
+    def _manifest(self, files):
+        """
+        Hash everything that determines the zip's contents
         
+        Covers each object's key, ETag, size and path in the zip plus the
+        settings that decide how members are compressed. It is stored as
+        metadata on the uploaded zip, so a re-run over unchanged sources is
+        recognized with one HEAD, and as the comment of the local zip.
+        """
+        compression, compression_level = self.compression
+        detect_compressed = self.config['options'].get('detect_compressed', True)
+        digest = hashlib.sha256(
+            f"{compression}\t{compression_level}\t{sorted(self.stored_extensions)}\t{detect_compressed}\n".encode()
+        )
+        for obj in sorted(files):
+            digest.update(f"{obj.key}\t{obj.etag}\t{obj.size}\t{obj.rel_path}\n".encode())
+        return digest.hexdigest()
+
+    def _upload_zip(self, zip_path, dest_bucket, dest_key, manifest):
+        """Upload zip file to S3"""
         # Upload the file
         try:
             self.logger.info(f"Uploading zip to: {dest_key}")
             self.s3_client.upload_file(
                 zip_path,
                 dest_bucket,
-                dest_key
+                dest_key,
+                ExtraArgs={'Metadata': {'manifest': manifest}}
             )
             self.logger.info(f"Successfully uploaded zip to: {dest_key}")
         except Exception as e:
@@ -288,24 +1239,53 @@ class S3FolderZipper:
         try:
             start_time = time.time()
             
-            # Get all files from source prefixes
-            all_files = []
-            for prefix in self.config['zip_config']['source_prefixes']:
-                files = self._list_s3_files(prefix)
+            # Check the destination first so a re-run of a finished job costs a single HEAD
+            dest_bucket, dest_key = self._destination()
+            dest_metadata = self._destination_metadata(dest_bucket, dest_key)
+            if dest_metadata is not None:
+                if not self.config['options'].get('overwrite_s3', False):
+                    self.logger.info(f"File exists in S3 and overwrite_s3 is False, skipping: s3://{dest_bucket}/{dest_key}")
+                    return
+                self.logger.info(f"File exists in S3 and overwrite_s3 is True, replacing it if the sources changed: s3://{dest_bucket}/{dest_key}")
+            
+            # Get all files from source prefixes, keyed by S3 key so overlapping prefixes are deduplicated
+            all_files = {}
+            for prefix, files in self._list_sources(self.config['zip_config']['source_prefixes']).items():
                 if not files:
                     logging.warning(f"No files found for prefix: {prefix}")
-                all_files.extend(files)
+                for obj in files:
+                    all_files.setdefault(obj.key, obj)
+            
+            # Different prefixes can map keys to the same relative path; rename collisions.
+            # Staged runs write the zip into the staging directory, so its name is taken there too
+            streaming = self.config['options'].get('streaming', False)
+            used_paths = set() if streaming else {self.config['zip_config']['output_zip_name']}
+            all_files = [
+                obj._replace(rel_path=_unique_arcname(obj.rel_path, used_paths))
+                for obj in all_files.values()
+            ]
+            # A path also can't be both a file and a directory (keys 'a' and 'a/b.txt', or 'a/.'
+            # once its '.' is dropped); rename such files and keep their new names off the directories
+            dirs = _parent_directories(used_paths)
+            if not dirs.isdisjoint(used_paths):
+                taken = used_paths | dirs
+                all_files = [
+                    obj._replace(rel_path=_unique_arcname(obj.rel_path, taken)) if obj.rel_path in dirs else obj
+                    for obj in all_files
+                ]
 
             if not all_files:
                 logging.error("No files found in any of the specified prefixes")
                 return
 
-            total_size = sum(
-                self.s3_client.head_object(
-                    Bucket=self.config['aws']['source_bucket'],
-                    Key=file
-                )['ContentLength'] for file in all_files
-            )
+            # An existing zip built from the same objects and settings is already up to date
+            manifest = self._manifest(all_files)
+            if dest_metadata is not None and dest_metadata.get('manifest') == manifest:
+                self.logger.info(f"File in S3 is up to date with the source files, skipping: s3://{dest_bucket}/{dest_key}")
+                return
+
+            # Sizes come from the listing, so no per-object HEAD is needed
+            total_size = sum(obj.size for obj in all_files)
             
             logging.info(f"Found {len(all_files)} files to process, total size: {total_size / (1024*1024):.2f} MB")
             
@@ -314,89 +1294,110 @@ class S3FolderZipper:
                 self._simulate_process(all_files)
                 return
 
-            # Get or create local directory
-            local_dir = self.config['zip_config'].get('local_directory', 'output')
-            local_dir = os.path.abspath(local_dir)
-            os.makedirs(local_dir, exist_ok=True)
-            
-            # Download files (will skip existing ones)
-            download_start = time.time()
-            downloaded_files = self._download_files(all_files, local_dir)
-            download_time = time.time() - download_start
-            logging.info(f"Download completed in {download_time:.2f} seconds")
-            
-            # Create zip file (will use existing if valid)
-            zip_start = time.time()
-            zip_path = self._create_zip(local_dir)
-            zip_time = time.time() - zip_start
-            zip_size = os.path.getsize(zip_path) / (1024*1024)  # Convert to MB
-            logging.info(f"Zip creation completed in {zip_time:.2f} seconds. Zip size: {zip_size:.2f} MB")
-            
-            # Upload zip file (will check if exists in S3)
-            upload_start = time.time()
-            self._upload_zip(zip_path)
-            upload_time = time.time() - upload_start
-            logging.info(f"Upload completed in {upload_time:.2f} seconds")
+            if streaming:
+                # Stream objects into a zip that is uploaded to S3 as it is written
+                zip_start = time.time()
+                zip_size = self._stream_zip(all_files, dest_bucket, dest_key, manifest)
+                zip_time = time.time() - zip_start
+                logging.info(f"Streamed zip creation and upload completed in {zip_time:.2f} seconds. Zip size: {zip_size / (1024*1024):.2f} MB")
+            else:
+                # Get or create the local staging directory
+                with self._staging_directory() as local_dir:
+                    # Download files (will skip existing ones)
+                    download_start = time.time()
+                    local_files = self._download_files(all_files, local_dir)
+                    download_time = time.time() - download_start
+                    logging.info(f"Download completed in {download_time:.2f} seconds")
+                    
+                    # Create zip file (will use existing if valid)
+                    zip_start = time.time()
+                    zip_path, zip_size = self._create_zip(local_files, local_dir, manifest)
+                    zip_time = time.time() - zip_start
+                    logging.info(f"Zip creation completed in {zip_time:.2f} seconds. Zip size: {zip_size / (1024*1024):.2f} MB")
+                    
+                    # Upload zip file
+                    upload_start = time.time()
+                    self._upload_zip(zip_path, dest_bucket, dest_key, manifest)
+                    upload_time = time.time() - upload_start
+                    logging.info(f"Upload completed in {upload_time:.2f} seconds")
             
             # Log total time and summary
             total_time = time.time() - start_time
             logging.info("\n=== Operation Summary ===")
             logging.info(f"Total files processed: {len(all_files)}")
             logging.info(f"Total input size: {total_size / (1024*1024):.2f} MB")
-            logging.info(f"Final zip size: {zip_size:.2f} MB")
-            logging.info(f"Compression ratio: {(1 - (zip_size * 1024*1024) / total_size) * 100:.1f}%")
-            logging.info(f"Download time: {download_time:.2f} seconds")
-            logging.info(f"Zip creation time: {zip_time:.2f} seconds")
-            logging.info(f"Upload time: {upload_time:.2f} seconds")
+            logging.info(f"Final zip size: {zip_size / (1024*1024):.2f} MB")
+            # All-empty inputs have no meaningful ratio
+            if total_size:
+                logging.info(f"Compression ratio: {(1 - zip_size / total_size) * 100:.1f}%")
+            if streaming:
+                logging.info(f"Streamed download, zip and upload time: {zip_time:.2f} seconds")
+            else:
+                logging.info(f"Download time: {download_time:.2f} seconds")
+                logging.info(f"Zip creation time: {zip_time:.2f} seconds")
+                logging.info(f"Upload time: {upload_time:.2f} seconds")
             logging.info(f"Total time: {total_time:.2f} seconds")
             logging.info("======================\n")
             
-            # Clean up if configured
-            if self.config['options'].get('delete_local_after', True):
+            # Clean up if configured; streaming leaves nothing on disk
+            if not streaming and self.config['options'].get('delete_local_after', True):
                 logging.info("Cleaning up local files")
-                for file in downloaded_files:
-                    if os.path.exists(file):
-                        os.remove(file)
-                if os.path.exists(zip_path):
-                    os.remove(zip_path)
-                # Remove empty directories
-                for root, dirs, files in os.walk(local_dir, topdown=False):
-                    for name in dirs:
-                        try:
-                            os.rmdir(os.path.join(root, name))
-                        except OSError:
-                            pass  # Directory not empty
-                try:
-                    os.rmdir(local_dir)
-                except OSError:
-                    pass  # Directory not empty or doesn't exist
+                self._clean_up_staging(local_files, zip_path, local_dir)
 
         except Exception as e:
             logging.error(f"Error processing folders: {str(e)}")
             raise
 
+    def _clean_up_staging(self, local_files, zip_path, local_dir):
+        """
+        Remove the staged files and the zip, then the directories this leaves empty
+        
+        Only paths this run staged are touched, so anything else in a shared
+        local_directory is kept. The empty directories are found from the staged
+        paths instead of walking the tree again; temporary staging directories
+        are already gone and make this a no-op.
+        """
+        dirs = {local_dir}
+        for file_path in [zip_path, *(path for _, path in local_files)]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+            # Collect every directory between the file and local_dir, stopping at one already seen
+            parent = os.path.dirname(file_path)
+            while parent not in dirs and len(parent) > len(local_dir):
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+        
+        # Deepest first, so subdirectories are removed before their parents
+        for path in sorted(dirs, key=len, reverse=True):
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass  # Directory not empty or doesn't exist
+
     def _simulate_process(self, files):
         """Simulate the process in dry run mode"""
         logging.info("=== DRY RUN MODE - No files will be downloaded or uploaded ===")
         
-        # Show files that would be downloaded
+        # Show files that would be downloaded, with sizes from the listing
         logging.info("\nFiles that would be downloaded:")
-        for file in files:
-            logging.info(f"  - s3://{self.config['aws']['source_bucket']}/{file}")
+        for obj in files:
+            logging.info(f"  - s3://{self.config['aws']['source_bucket']}/{obj.key} ({obj.size / (1024*1024):.2f} MB)")
         
         # Show zip file that would be created
         zip_name = self.config['zip_config']['output_zip_name']
         logging.info(f"\nZip file that would be created: {zip_name}")
         
         # Show destination
-        dest_prefix = self.config['zip_config'].get('destination_prefix', '')
-        dest_bucket = self.config['aws']['destination_bucket']
-        dest_path = f"s3://{dest_bucket}/{dest_prefix}{zip_name}"
+        dest_bucket, dest_key = self._destination()
+        dest_path = f"s3://{dest_bucket}/{dest_key}"
         logging.info(f"\nZip file would be uploaded to: {dest_path}")
         
         # Show compression info
-        compression = self.config['options'].get('compression_level', 9)
-        logging.info(f"\nCompression level that would be used: {compression}")
+        compression, compression_level = self.compression
+        if compression == zipfile.ZIP_STORED:
+            logging.info("\nCompression that would be used: none (stored)")
+        else:
+            logging.info(f"\nCompression level that would be used: {compression_level}")
         
         logging.info("\n=== End of Dry Run Summary ===")
 